@@ -13,10 +13,12 @@ setup(
     },
     install_requires=[
         "beautifulsoup4>=4.12.0",
+        "lxml>=4.9.3",
         "requests>=2.31.0",
         "selenium>=4.15.0",
         "webdriver-manager>=4.0.1",
         "pandas>=2.1.0",
+        "pyarrow>=14.0.1",
         "tqdm>=4.66.0",
         "retrying>=1.3.4",
         "streamlit>=1.28.0",
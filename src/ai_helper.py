@@ -1,7 +1,7 @@
 """AI helper module for processing Spotify chart data."""
 import logging
 import os
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
 import openai
 import streamlit as st
 import json
@@ -19,14 +19,18 @@ class AIHelper:
         
         self.client = OpenAI(api_key=api_key)
     
-    def analyze_track_data(self, data: List[Dict]) -> str:
+    def analyze_track_data(self, data: Union[str, List[Dict]], raise_errors: bool = False) -> str:
         """
         Analyze track streaming data using OpenAI's API.
         Returns exactly 5 bullet points of key information.
+        
+        Args:
+            data: Track history as CSV text, or as a list of row dicts
+            raise_errors: Re-raise API errors instead of returning an error message
         """
         try:
-            # Convert data to a readable format
-            data_str = json.dumps(data, indent=2)
+            # Convert data to a readable format; CSV text is sent as is
+            data_str = data if isinstance(data, str) else json.dumps(data, indent=2)
             
             # Create the prompt
             prompt = f"""
@@ -60,6 +64,8 @@ class AIHelper:
             
         except Exception as e:
             logger.error(f"Error analyzing data with AI: {e}")
+            if raise_errors:
+                raise
             return "Error analyzing data. Please try again."
 
     def clean_and_format_data(self, raw_data: List[Dict]) -> List[Dict]:
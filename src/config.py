@@ -3,7 +3,14 @@
 # Scraper settings
 KWORB_BASE_URL = "https://kworb.net/spotify"
 WAIT_TIME = 15  # seconds - increased for slower connections
+POLL_INTERVAL = 0.2  # seconds between explicit-wait condition checks
 RETRY_COUNT = 5  # increased number of retries
+DRIVER_POOL_SIZE = 4  # idle Chrome instances kept warm for reuse
+HTTP_POOL_SIZE = 32  # keep-alive connections to kworb.net per session
+
+# Parsed-page cache, revalidated with ETag/Last-Modified once stale
+CACHE_DIR = "~/.cache/kworb"
+CACHE_MAX_AGE = 3600  # seconds a cached page is served without revalidating
 
 # Streamlit settings
 STREAMLIT_PAGE_TITLE = "Spotify Chart Analyzer"
@@ -17,6 +17,9 @@ def process_charts():
     processed_data_path = Path("data/processed/ai_processed_charts.csv")
     insights_path = Path("data/processed/ai_insights.txt")
     
+    # Both outputs live in the same directory; create it once
+    processed_data_path.parent.mkdir(parents=True, exist_ok=True)
+    
     # Read the raw data
     print(f"\nReading data from {raw_data_path}...")
     raw_df = pd.read_csv(raw_data_path)
@@ -32,7 +35,6 @@ def process_charts():
         print("\n=== AI Insights ===")
         print(insights["insights"])
         # Save insights to file
-        insights_path.parent.mkdir(parents=True, exist_ok=True)
         with open(insights_path, 'w') as f:
             f.write(insights["insights"])
         print(f"\nInsights saved to {insights_path}")
@@ -54,7 +56,6 @@ def process_charts():
     
     # Save processed data
     print(f"\nSaving processed data to {processed_data_path}...")
-    processed_data_path.parent.mkdir(parents=True, exist_ok=True)
     cleaned_df.to_csv(processed_data_path, index=False)
     
     print("\nProcessing completed successfully!")
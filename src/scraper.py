@@ -1,35 +1,274 @@
-"""Web scraping functionality for Spotify chart data."""
-import streamlit as st
+"""Web scraping functionality for Spotify chart data.
+
+Selenium and fake_useragent are imported where they are used: pages are
+fetched over plain HTTP and the browser is only a fallback, so most runs
+never need them.
+"""
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.support.expected_conditions import presence_of_element_located, visibility_of_element_located
-from fake_useragent import UserAgent
+import lxml.html
+from lxml import etree
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import atexit
 import logging
+import sqlite3
 import time
 import random
+import queue
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import StringIO
 from pathlib import Path
-from datetime import datetime
-from typing import Optional, Dict, List, Union
+from typing import Callable, Collection, Optional, Dict, List, Union
+
+from src.config import (
+    KWORB_BASE_URL, WAIT_TIME, POLL_INTERVAL, RETRY_COUNT, DRIVER_POOL_SIZE, HTTP_POOL_SIZE,
+    CACHE_DIR, CACHE_MAX_AGE
+)
+
+# Any of the layouts kworb uses for a track's history table, matched in a
+# single query instead of probing each locator in turn
+TRACK_TABLE_XPATH = "//div[contains(@class,'weekly')]/table | //table[.//th[contains(.,'Date')]]"
+
+# Compiled once and reused by the lxml parsers
+_TH = etree.XPath('.//th')
+_TR = etree.XPath('.//tr')
+_TD = etree.XPath('./td')
+_SPAN_S = etree.XPath('.//span[@class="s"]')
+_TITLE = etree.XPath('string(//h1)')
+_ARTIST = etree.XPath('string(//h1/following-sibling::p[1])')
+_VIEW_TABLE = etree.XPath('//div[contains(@class, $view)]/table')
+_TRACK_TABLE = etree.XPath(TRACK_TABLE_XPATH)
+
+# Digit-group separators dropped from number cells in one str.translate pass
+_NUMBER_SEPARATORS = str.maketrans("", "", ", ")
+
+# Share of a text column's non-blank cells that must parse as numbers for
+# the column to be converted; the rest (e.g. "-" placeholders) become NaN
+_NUMERIC_SHARE = 0.9
 
-from src.config import KWORB_BASE_URL, WAIT_TIME, RETRY_COUNT
+# Selenium locators for switching a track page to its daily view (the
+# By.ID/By.CSS_SELECTOR values, so Selenium needn't be imported here)
+_DAILY_BUTTON = ("id", "daily")
+_DAILY_TABLE = ("css selector", "div.daily table")
+
+class PageCache:
+    """On-disk cache of parsed pages, revalidated with conditional GETs.
+    
+    Kworb pages change at most daily, so a page stored within the last
+    CACHE_MAX_AGE seconds is served without a request at all. Older entries
+    send the stored ETag/Last-Modified and a 304 response is served from a
+    Parquet file instead of downloading and parsing the page again.
+    """
+    
+    def __init__(self, cache_dir: Union[str, Path] = CACHE_DIR):
+        """Initialize the cache, opening (or creating) its index database."""
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_file = self.cache_dir / "index.sqlite"
+        self._lock = threading.Lock()
+        # One row per page, so storing an entry doesn't rewrite the whole index
+        self._db = sqlite3.connect(str(self.index_file), check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pages "
+                "(key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, path TEXT NOT NULL, stored_at REAL)"
+            )
+    
+    def _entry(self, key: str) -> Optional[Dict[str, str]]:
+        """Look up the index entry for a key."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, path, stored_at FROM pages WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "path": row[2], "stored_at": row[3]}
+    
+    def conditional_headers(self, key: str) -> Dict[str, str]:
+        """Build If-None-Match/If-Modified-Since headers for a cached entry."""
+        entry = self._entry(key)
+        if not entry or not Path(entry["path"]).exists():
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+    
+    def load(self, key: str, max_age: Optional[float] = None) -> Optional[pd.DataFrame]:
+        """Load the cached DataFrame for a key.
+        
+        Args:
+            key: Cache key
+            max_age: If given, only return the entry if it was stored or
+                revalidated at most this many seconds ago
+        """
+        entry = self._entry(key)
+        if not entry:
+            return None
+        if max_age is not None and (entry["stored_at"] is None or time.time() - entry["stored_at"] > max_age):
+            return None
+        try:
+            return pd.read_parquet(entry["path"], dtype_backend="pyarrow")
+        except Exception as e:
+            logging.warning(f"Could not read cached page {entry['path']}: {e}")
+            return None
+    
+    def touch(self, key: str):
+        """Mark an entry as revalidated now (after a 304)."""
+        try:
+            with self._lock, self._db:
+                self._db.execute("UPDATE pages SET stored_at = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.Error as e:
+            logging.warning(f"Could not write cache index: {e}")
+    
+    def store(self, key: str, response: requests.Response, df: pd.DataFrame):
+        """Cache a parsed page along with any validators the server sent."""
+        path = self.cache_dir / f"{key.replace('/', '_').replace(':', '_')}.parquet"
+        try:
+            df.to_parquet(path, index=False, compression='zstd')
+        except Exception as e:
+            logging.warning(f"Could not cache page {key}: {e}")
+            return
+        
+        try:
+            with self._lock, self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO pages (key, etag, last_modified, path, stored_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                     str(path), time.time())
+                )
+        except sqlite3.Error as e:
+            logging.warning(f"Could not write cache index: {e}")
+
+# Used when fake_useragent cannot load its database
+FALLBACK_USER_AGENTS = [
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15",
+]
 
 class ChartScraper:
     """Scraper for Spotify chart data."""
     
-    def __init__(self, use_selenium: bool = True):
-        """Initialize the scraper."""
-        self.use_selenium = use_selenium
+    # Shared fake_useragent instance, loaded once per process; False if it
+    # failed to load, so the fallback list is used without retrying
+    _ua = None
+    
+    # Idle Chrome drivers handed back by closed scrapers, reused by new ones
+    _driver_pool = queue.Queue(maxsize=DRIVER_POOL_SIZE)
+    
+    def __init__(
+        self,
+        use_selenium: bool = False,
+        anti_bot: bool = False,
+        use_cache: bool = True,
+        debug: bool = False
+    ):
+        """Initialize the scraper.
+        
+        Args:
+            use_selenium: Start a headless Chrome session up front instead of
+                on first need. Pages are still fetched over HTTP first and
+                only fall back to the browser when the static HTML has no
+                table.
+            anti_bot: Simulate human scrolling/mouse movement on each page load.
+                kworb.net has no bot challenge, so this is off by default.
+            use_cache: Revalidate previously scraped pages with conditional
+                GETs on the HTTP path instead of re-downloading them
+            debug: Dump each Selenium-rendered page to debug_*.html
+        """
+        self.anti_bot = anti_bot
+        self.debug = debug
         self.driver = None
+        self._driver_lock = threading.RLock()
+        # (page kind, data_type) -> when its static HTML last had no table but
+        # its rendered page did; until that is CACHE_MAX_AGE old, pages of that
+        # kind skip the HTTP fetch (but not the page cache)
+        self._needs_browser: Dict[tuple, float] = {}
+        self.cache = PageCache() if use_cache else None
+        self.session = self._build_session()
+        self._write_queue = queue.Queue(maxsize=64)
+        self._writer_thread = None
+        self._closed = False
+        # Close at exit unless closed earlier; the set holds it weakly
+        _open_scrapers.add(self)
         if use_selenium:
             self._setup_driver()
     
+    def __enter__(self) -> "ChartScraper":
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    @classmethod
+    def _get_ua(cls):
+        """Get the process-wide UserAgent, loading its database on first use."""
+        if cls._ua is None:
+            from fake_useragent import UserAgent
+            cls._ua = UserAgent()
+        return cls._ua
+    
+    @classmethod
+    def _random_user_agent(cls) -> str:
+        """Pick a random user agent, falling back to a built-in list."""
+        if cls._ua is not False:
+            try:
+                return cls._get_ua().random
+            except Exception as e:
+                logging.warning(f"fake_useragent unavailable, using fallback user agents: {e}")
+                cls._ua = False
+        return random.choice(FALLBACK_USER_AGENTS)
+    
+    def _build_session(self) -> requests.Session:
+        """Create a pooled HTTP session for pages that don't need a browser."""
+        session = requests.Session()
+        session.headers["User-Agent"] = self._random_user_agent()
+        retry = Retry(
+            total=RETRY_COUNT,
+            backoff_factor=0.5,
+            # 429 is retried too; Retry waits out any Retry-After header first
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"]
+        )
+        # Everything comes from one host, so a single host pool with many
+        # keep-alive connections lets concurrent fetches skip TCP/TLS setup
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    
+    @classmethod
+    def close_pool(cls):
+        """Quit every idle pooled driver (registered to run at exit)."""
+        while True:
+            try:
+                driver = cls._driver_pool.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                driver.quit()
+            except Exception as e:
+                logging.warning(f"Error closing WebDriver: {e}")
+    
     def _setup_driver(self):
-        """Set up the Selenium WebDriver with Chrome."""
+        """Set up the Selenium WebDriver with Chrome, reusing a pooled one if available."""
+        try:
+            self.driver = ChartScraper._driver_pool.get_nowait()
+            logging.info("Reusing pooled Chrome WebDriver")
+            return
+        except queue.Empty:
+            pass
+        
+        from selenium import webdriver
+        
         options = webdriver.ChromeOptions()
         options.add_argument('--headless=new')  # Use new headless mode
         options.add_argument('--no-sandbox')
@@ -37,12 +276,27 @@ class ChartScraper:
         options.add_argument('--disable-gpu')
         options.add_argument('--window-size=1920,1080')
         options.add_argument('--disable-blink-features=AutomationControlled')
+        # Images, extensions and background services are irrelevant to scraping
+        options.add_argument('--blink-settings=imagesEnabled=false')
+        options.add_argument('--disable-extensions')
+        options.add_argument('--disable-background-networking')
+        options.add_argument('--disable-sync')
+        # Share one on-disk HTTP cache across drivers so kworb's scripts are
+        # reused between tracks and runs
+        options.add_argument(f'--disk-cache-dir={Path(CACHE_DIR).expanduser() / "chrome"}')
+        options.add_argument('--disk-cache-size=268435456')
+        options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.default_content_setting_values.notifications": 2,
+        })
         options.add_experimental_option("excludeSwitches", ["enable-automation"])
         options.add_experimental_option('useAutomationExtension', False)
+        # Return from driver.get at DOMContentLoaded; the chart table is in the
+        # initial HTML, so there is no need to wait for trackers and images
+        options.page_load_strategy = 'eager'
         
         # Add random user agent
-        ua = UserAgent()
-        user_agent = ua.random
+        user_agent = self._random_user_agent()
         options.add_argument(f'user-agent={user_agent}')
         
         # Add additional headers
@@ -57,6 +311,17 @@ class ChartScraper:
                 "acceptLanguage": "en-US,en;q=0.9"
             })
             
+            # Drop non-HTML subresources and trackers; only the table markup is needed
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {
+                "urls": [
+                    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+                    "*.css", "*.woff", "*.woff2", "*.ttf", "*.otf",
+                    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+                    "*googlesyndication.com*"
+                ]
+            })
+            
             # Add webdriver detection evasion
             self.driver.execute_script("""
                 Object.defineProperty(navigator, 'webdriver', {
@@ -67,7 +332,9 @@ class ChartScraper:
                 };
             """)
             
-            self.driver.implicitly_wait(WAIT_TIME)
+            # No implicit wait: every missed find_element would stall for the
+            # full timeout. Explicit waits are used where polling is needed.
+            self.driver.implicitly_wait(0)
         except Exception as e:
             logging.error(f"Failed to initialize Chrome WebDriver: {e}")
             raise
@@ -76,21 +343,35 @@ class ChartScraper:
         """Add random delay to simulate human behavior."""
         time.sleep(random.uniform(min_seconds, max_seconds))
     
+    def _backoff(self, retries: int):
+        """Sleep before a retry, doubling the delay each attempt (capped at 30 s) with jitter.
+        
+        Does nothing once retries reaches RETRY_COUNT, since no attempt follows.
+        """
+        if retries >= RETRY_COUNT:
+            return
+        time.sleep(min(30, 0.5 * 2 ** retries) + random.random() * 0.25)
+    
     def _simulate_human_behavior(self):
-        """Simulate human-like behavior on the page."""
+        """Simulate human-like behavior on the page (only when anti_bot is enabled)."""
+        if not self.anti_bot:
+            return
+        
         try:
             # Random scroll
             scroll_amount = random.randint(100, 500)
             self.driver.execute_script(f"window.scrollBy(0, {scroll_amount});")
             self._random_sleep(0.5, 1.5)
             
-            # Random mouse movements
-            actions = ActionChains(self.driver)
+            # Random mouse movements to absolute viewport points; relative
+            # offsets would accumulate and leave the window
+            from selenium.webdriver.common.actions.action_builder import ActionBuilder
+            actions = ActionBuilder(self.driver)
             for _ in range(random.randint(2, 5)):
                 x = random.randint(0, 500)
                 y = random.randint(0, 500)
-                actions.move_by_offset(x, y)
-                self._random_sleep(0.1, 0.3)
+                actions.pointer_action.move_to_location(x, y).pause(random.uniform(0.1, 0.3))
+            actions.perform()
             
             # Sometimes move back to top
             if random.random() < 0.3:
@@ -99,34 +380,59 @@ class ChartScraper:
         except Exception as e:
             logging.warning(f"Error during human behavior simulation: {e}")
     
-    def _get_url_for_track(self, track_id: str) -> str:
+    @staticmethod
+    def _get_url_for_track(track_id: str) -> str:
         """Get the URL for a track's chart data."""
         return f"{KWORB_BASE_URL}/track/{track_id}.html"
     
-    def _get_url_for_country(self, country_code: str, data_type: str = "daily") -> str:
+    @staticmethod
+    def _get_url_for_country(country_code: str, data_type: str = "daily") -> str:
         """Get the URL for a country's chart data."""
         return f"{KWORB_BASE_URL}/country/{country_code}_{data_type}.html"
     
+    @staticmethod
+    def _write_worker(write_queue: queue.Queue):
+        """Write queued files until the None sentinel arrives.
+        
+        Takes only the queue so the thread doesn't keep the scraper alive.
+        """
+        while True:
+            item = write_queue.get()
+            try:
+                if item is None:
+                    return
+                path, text = item
+                Path(path).write_text(text, encoding="utf-8")
+                logging.info(f"Saved page source to {path}")
+            except OSError as e:
+                logging.warning(f"Could not write {item[0]}: {e}")
+            finally:
+                write_queue.task_done()
+    
+    def _save_debug_html(self, path: str, html: str):
+        """Queue a debug page dump so the disk write doesn't block scraping."""
+        if not self.debug:
+            return
+        if self._writer_thread is None:
+            self._writer_thread = threading.Thread(
+                target=self._write_worker, args=(self._write_queue,), daemon=True
+            )
+            self._writer_thread.start()
+        self._write_queue.put((path, html))
+    
     def _wait_for_page_load(self):
-        """Wait for the page to be fully loaded."""
+        """Wait for the page's DOM to be ready."""
+        from selenium.webdriver.support.ui import WebDriverWait
+        
         try:
-            # Wait for the document to be ready
-            self.driver.execute_script("""
-                return new Promise((resolve) => {
-                    if (document.readyState === 'complete') {
-                        resolve();
-                    } else {
-                        window.addEventListener('load', resolve);
-                    }
-                });
-            """)
-            
-            # Add random delay
-            self._random_sleep(1.0, 2.0)
-            
-            # Wait for any table to be present
-            WebDriverWait(self.driver, WAIT_TIME).until(
-                presence_of_element_located((By.TAG_NAME, "table"))
+            # Wait for a fully parsed document with a populated table rather
+            # than sleeping a fixed time. With the eager strategy this usually
+            # holds on the first poll.
+            WebDriverWait(self.driver, WAIT_TIME, poll_frequency=POLL_INTERVAL).until(
+                lambda d: d.execute_script(
+                    "return document.readyState !== 'loading' && "
+                    "document.querySelector('table tr td') !== null;"
+                )
             )
             
             # Simulate human behavior
@@ -137,64 +443,124 @@ class ChartScraper:
             logging.error(f"Error waiting for page load: {e}")
             return False
     
-    def _extract_cell_value(self, cell) -> str:
-        """Extract value from a cell, handling both simple and nested span structures."""
-        try:
-            # First try to find the span with class 's' (daily view)
-            value_span = cell.find_element(By.CSS_SELECTOR, "span.s")
-            if value_span:
-                return value_span.text.strip()
-        except NoSuchElementException:
-            # If no span.s found, try direct cell text (weekly view)
-            return cell.text.strip()
-        except Exception as e:
-            logging.warning(f"Error extracting cell value: {e}")
-            return ""
-    
-    def _extract_table_data(self, table_element) -> pd.DataFrame:
-        """Extract data from a table element into a DataFrame."""
-        headers = []
+    @staticmethod
+    def _parse_number(text: str) -> Optional[Union[int, float]]:
+        """Parse a comma-grouped number, returning None for blanks and non-numbers."""
+        value = text.translate(_NUMBER_SEPARATORS)
+        if not value:
+            # Most cells of a track table are blank (not charting there);
+            # skip the two failed conversions
+            return None
         try:
-            header_cells = table_element.find_elements(By.TAG_NAME, "th")
-            headers = [cell.text.strip() for cell in header_cells]
-            logging.info(f"Found {len(headers)} columns: {headers}")
-        except NoSuchElementException:
-            logging.warning("No header cells found in table")
-            return pd.DataFrame()
-        
-        rows = []
+            return int(value)
+        except ValueError:
+            pass
         try:
-            row_elements = table_element.find_elements(By.TAG_NAME, "tr")
-            logging.info(f"Found {len(row_elements)} rows")
+            return float(value)
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def _parse_table(root, text_columns: Collection[str]) -> pd.DataFrame:
+        """Parse an lxml table element into a DataFrame.
+        
+        Daily views nest the value in span.s, weekly views hold it directly in the cell.
+        
+        Args:
+            root: lxml table element
+            text_columns: Columns kept as strings; every other column is
+                parsed as numbers before the DataFrame is built, and all
+                columns get nullable pyarrow-backed dtypes
+        """
+        headers = [th.text_content().strip() for th in _TH(root)]
+        logging.info(f"Found {len(headers)} columns: {headers}")
+        
+        # Collect cells column by column, matching pandas' columnar storage
+        columns = [[] for _ in headers]
+        for tr in _TR(root):
+            cells = _TD(tr)
+            if not cells:  # Skip header row
+                continue
             
-            for row in row_elements:
-                cells = row.find_elements(By.TAG_NAME, "td")
-                if cells:  # Skip header row
-                    row_data = []
-                    for cell in cells:
-                        value = self._extract_cell_value(cell)
-                        row_data.append(value)
-                    
-                    if len(row_data) == len(headers):  # Only add rows that match header length
-                        rows.append(row_data)
-                    else:
-                        logging.warning(f"Row data length ({len(row_data)}) doesn't match headers length ({len(headers)})")
-        except NoSuchElementException:
-            logging.warning("No data rows found in table")
-            return pd.DataFrame()
+            if len(cells) == len(headers):  # Only add rows that match header length
+                for column, td in zip(columns, cells):
+                    column.append((_SPAN_S(td) or [td])[0].text_content().strip())
+            else:
+                logging.warning(f"Row data length ({len(cells)}) doesn't match headers length ({len(headers)})")
+        
+        parse_number = ChartScraper._parse_number
+        columns = [
+            column if header in text_columns else [parse_number(value) for value in column]
+            for header, column in zip(headers, columns)
+        ]
         
-        # Create DataFrame
-        df = pd.DataFrame(rows, columns=headers)
+        # Create DataFrame (keyed by position so duplicate headers survive)
+        df = pd.DataFrame(dict(enumerate(columns)))
+        df.columns = headers
+        df = df.convert_dtypes(dtype_backend="pyarrow")
         logging.info(f"Created DataFrame with {len(df)} rows and {len(df.columns)} columns")
         return df
     
-    def scrape_country_chart(self, country_code: str, data_type: str = "daily") -> Optional[pd.DataFrame]:
-        """Scrape chart data for a specific country."""
-        if not self.use_selenium or not self.driver:
-            logging.error("Selenium WebDriver not initialized")
+    def _parse_country_page(self, html: str, country_code: str, data_type: str) -> Optional[pd.DataFrame]:
+        """Parse a country chart page, or return None if it has no chart table."""
+        try:
+            df = pd.read_html(StringIO(html), flavor='lxml')[0]
+        except ValueError:
+            return None
+        if df.empty:
             return None
         
+        # Add metadata
+        df['country'] = country_code.upper()
+        df['data_type'] = data_type
+        
+        # Clean up numeric columns, then store everything as Arrow arrays
+        df = self._to_numeric(df, exclude=['date', 'country', 'data_type', 'song_name', 'artist_name'])
+        return df.convert_dtypes(dtype_backend="pyarrow")
+    
+    def scrape_country_chart(self, country_code: str, data_type: str = "daily") -> Optional[pd.DataFrame]:
+        """Scrape chart data for a specific country.
+        
+        The chart is server-rendered, so it is fetched over plain HTTP first;
+        Selenium is only used if the static HTML has no chart table. Once
+        that happens for a data_type, later charts of it skip the HTTP try
+        (cached pages are still used) until CACHE_MAX_AGE has passed.
+        """
         url = self._get_url_for_country(country_code, data_type)
+        page_kind = ("country", data_type)
+        
+        browser_only = self._prefers_browser(page_kind)
+        try:
+            df = self._fetch_parsed(
+                url, f"country_{country_code}_{data_type}",
+                lambda html: self._parse_country_page(html, country_code, data_type),
+                cache_only=browser_only
+            )
+        except requests.RequestException as e:
+            logging.error(f"Error fetching country chart {country_code}: {e}")
+            return None
+        
+        if df is not None:
+            return df
+        
+        if not browser_only:
+            logging.warning(f"No chart table in static HTML for {country_code}, falling back to Selenium")
+        
+        # One WebDriver per scraper: serialize threads that share this instance
+        with self._driver_lock:
+            return self._render_country_chart(url, country_code, data_type, page_kind)
+    
+    def _render_country_chart(self, url: str, country_code: str, data_type: str,
+                              page_kind: tuple) -> Optional[pd.DataFrame]:
+        """Scrape a country chart through Selenium; call with _driver_lock held."""
+        if not self.driver:
+            try:
+                self._setup_driver()
+            except Exception:
+                return None
+        
+        from selenium.common.exceptions import TimeoutException
+        
         retries = 0
         
         while retries < RETRY_COUNT:
@@ -206,56 +572,191 @@ class ChartScraper:
                 if not self._wait_for_page_load():
                     logging.error("Page failed to load completely")
                     retries += 1
-                    self._random_sleep(2.0, 4.0)  # Longer delay between retries
+                    self._backoff(retries)
                     continue
                 
-                # Save page source for debugging
-                with open(f"debug_{country_code}_{data_type}.html", "w", encoding="utf-8") as f:
-                    f.write(self.driver.page_source)
-                logging.info(f"Saved page source to debug_{country_code}_{data_type}.html")
-                
-                # Wait for table
-                wait = WebDriverWait(self.driver, WAIT_TIME)
-                table = wait.until(EC.presence_of_element_located((By.TAG_NAME, "table")))
+                # Fetch the rendered HTML once and parse the chart table locally
+                html = self.driver.page_source
                 
-                # Extract table data
-                df = self._extract_table_data(table)
+                # Save page source for debugging
+                self._save_debug_html(f"debug_{country_code}_{data_type}.html", html)
                 
-                if df.empty:
+                df = self._parse_country_page(html, country_code, data_type)
+                if df is None:
                     logging.warning("No data found in table")
                     retries += 1
-                    self._random_sleep(2.0, 4.0)
+                    self._backoff(retries)
                     continue
                 
-                # Add metadata
-                df['country'] = country_code.upper()
-                df['data_type'] = data_type
-                
-                # Clean up numeric columns
-                for col in df.columns:
-                    if col not in ['date', 'country', 'data_type', 'song_name', 'artist_name']:
-                        df[col] = pd.to_numeric(df[col].str.replace(',', ''), errors='coerce')
-                
+                self._needs_browser[page_kind] = time.monotonic()
                 return df
                 
             except TimeoutException:
                 logging.error(f"Timeout waiting for table to load: {url}")
                 retries += 1
-                self._random_sleep(2.0, 4.0)
+                self._backoff(retries)
             except Exception as e:
                 logging.error(f"Error scraping country chart {country_code}: {e}")
                 retries += 1
-                self._random_sleep(2.0, 4.0)
+                self._backoff(retries)
         
         return None
     
+    @staticmethod
+    def _to_numeric(df: pd.DataFrame, exclude: List[str]) -> pd.DataFrame:
+        """Convert comma-grouped number columns to numeric in one block operation.
+        
+        Columns that are already numeric (e.g. parsed by read_html) are left
+        alone, as are text columns that are not mostly numbers.
+        """
+        num_cols = [
+            col for col in df.columns
+            if col not in exclude and (
+                pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col])
+            )
+        ]
+        if num_cols:
+            block = df[num_cols]
+            converted = block.apply(
+                lambda s: pd.to_numeric(s.astype(str).str.replace(',', '', regex=False), errors='coerce')
+            )
+            # Keep conversions where nearly every non-blank value parsed
+            parsed = converted.notna().sum() >= _NUMERIC_SHARE * block.notna().sum()
+            parsed &= converted.notna().any()
+            if parsed.any():
+                df[parsed.index[parsed]] = converted.loc[:, parsed]
+        return df
+    
+    @staticmethod
+    def _add_track_info(df: pd.DataFrame, title: str, artist: str) -> pd.DataFrame:
+        """Attach track info columns and convert stream counts to numbers."""
+        # Add track info columns; categorical stores the one repeated value
+        # once, with a small integer code per row
+        df['song_name'] = pd.Series(title, index=df.index, dtype='category')
+        df['artist_name'] = pd.Series(artist, index=df.index, dtype='category')
+        
+        return ChartScraper._to_numeric(df, exclude=['date', 'song_name', 'artist_name'])
+    
+    def _parse_track_page(self, html: str, data_type: str = "weekly") -> Optional[pd.DataFrame]:
+        """Parse a static track page, or return None if it has no history table."""
+        root = lxml.html.fromstring(html)
+        
+        # Both views are in the page source; pick the requested one. Only the
+        # weekly view falls back to the other table layouts, which are all
+        # weekly: a page without a daily table needs the browser's daily view
+        tables = _VIEW_TABLE(root, view=data_type)
+        if not tables and data_type == "weekly":
+            tables = _TRACK_TABLE(root)
+        if not tables:
+            return None
+        
+        df = self._parse_table(tables[0], text_columns=('date',))
+        if df.empty:
+            return None
+        
+        title = _TITLE(root).strip() or "Unknown"
+        artist = _ARTIST(root).strip() or "Unknown"
+        logging.info(f"Found track info - Title: {title}, Artist: {artist}")
+        
+        return self._add_track_info(df, title, artist)
+    
+    def _prefers_browser(self, page_kind: tuple) -> bool:
+        """Whether pages of this kind recently needed Selenium to render."""
+        since = self._needs_browser.get(page_kind)
+        if since is None:
+            return False
+        if time.monotonic() - since > CACHE_MAX_AGE:
+            self._needs_browser.pop(page_kind, None)
+            return False
+        return True
+    
+    def _fetch_parsed(
+        self, url: str, key: str, parse: Callable[[str], Optional[pd.DataFrame]],
+        cache_only: bool = False
+    ) -> Optional[pd.DataFrame]:
+        """Fetch and parse a page over HTTP, going through the page cache.
+        
+        Args:
+            url: Page URL
+            key: Cache key for the parsed page
+            parse: Turns the page HTML into a DataFrame, or None if it has no table
+            cache_only: Only return a fresh cached copy; never hit the network
+        """
+        if self.cache:
+            df = self.cache.load(key, max_age=CACHE_MAX_AGE)
+            if df is not None:
+                logging.info(f"Using cached data for {key}")
+                return df
+        if cache_only:
+            return None
+        headers = self.cache.conditional_headers(key) if self.cache else {}
+        
+        logging.info(f"Fetching URL: {url}")
+        response = self.session.get(url, headers=headers, timeout=WAIT_TIME)
+        if response.status_code == 304:
+            df = self.cache.load(key)
+            if df is not None:
+                logging.info(f"Page not modified, using cached data for {key}")
+                self.cache.touch(key)
+                return df
+            # Cached copy is unreadable; fetch the full page again
+            response = self.session.get(url, timeout=WAIT_TIME)
+        response.raise_for_status()
+        
+        df = parse(response.text)
+        if df is not None and self.cache:
+            self.cache.store(key, response, df)
+        return df
+    
     def scrape_track_history(self, track_id: str, data_type: str = "weekly") -> Optional[pd.DataFrame]:
-        """Scrape streaming history for a track."""
-        if not self.use_selenium or not self.driver:
+        """Scrape streaming history for a track.
+        
+        The page is server-rendered, so it is fetched over plain HTTP first;
+        Selenium is only used if the static HTML has no history table. Once
+        that happens for a data_type, later tracks of it skip the HTTP try
+        (cached pages are still used) until CACHE_MAX_AGE has passed.
+        """
+        url = self._get_url_for_track(track_id)
+        page_kind = ("track", data_type)
+        
+        browser_only = self._prefers_browser(page_kind)
+        try:
+            df = self._fetch_parsed(
+                url, f"track_{track_id}_{data_type}",
+                lambda html: self._parse_track_page(html, data_type),
+                cache_only=browser_only
+            )
+        except requests.RequestException as e:
+            logging.error(f"Error fetching track {track_id}: {e}")
+            return None
+        
+        if df is not None:
+            return df
+        
+        if not browser_only:
+            logging.warning(f"No history table in static HTML for {track_id}, falling back to Selenium")
+        
+        # One WebDriver per scraper: serialize threads that share this instance
+        with self._driver_lock:
+            return self._render_track_history(url, track_id, data_type, page_kind)
+    
+    def _render_track_history(self, url: str, track_id: str, data_type: str,
+                              page_kind: tuple) -> Optional[pd.DataFrame]:
+        """Scrape a track's history through Selenium; call with _driver_lock held."""
+        if not self.driver:
+            try:
+                self._setup_driver()
+            except Exception:
+                return None
+        
+        if not self.driver:
             logging.error("Selenium WebDriver not initialized")
             return None
         
-        url = self._get_url_for_track(track_id)
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.support.expected_conditions import visibility_of_element_located
+        from selenium.webdriver.support.ui import WebDriverWait
+        
         retries = 0
         
         while retries < RETRY_COUNT:
@@ -267,76 +768,212 @@ class ChartScraper:
                 if not self._wait_for_page_load():
                     logging.error("Page failed to load completely")
                     retries += 1
-                    self._random_sleep(2.0, 4.0)  # Longer delay between retries
+                    self._backoff(retries)
                     continue
                 
-                # Save page source for debugging
-                with open(f"debug_{track_id}.html", "w", encoding="utf-8") as f:
-                    f.write(self.driver.page_source)
-                logging.info(f"Saved page source to debug_{track_id}.html")
-                
                 # Switch to the desired view
                 if data_type == "daily":
-                    # Try to find and click the daily button
-                    try:
-                        daily_button = self.driver.find_element(By.ID, "daily")
-                        if daily_button:
-                            daily_button.click()
-                            self._random_sleep(2.0, 3.0)
-                    except:
+                    # Try to find and click the daily button; find_elements
+                    # returns [] immediately instead of raising when it's missing
+                    daily_buttons = self.driver.find_elements(*_DAILY_BUTTON)
+                    if daily_buttons:
+                        try:
+                            daily_buttons[0].click()
+                            # Return as soon as the daily table is shown
+                            WebDriverWait(self.driver, 5, poll_frequency=POLL_INTERVAL).until(
+                                visibility_of_element_located(_DAILY_TABLE)
+                            )
+                        except TimeoutException:
+                            logging.warning("Daily view did not appear after switching")
+                    else:
                         logging.warning("Could not find daily view button")
                 
-                # Wait for table after view switch
-                wait = WebDriverWait(self.driver, WAIT_TIME)
-                table = wait.until(EC.presence_of_element_located((By.TAG_NAME, "table")))
+                # Fetch the rendered HTML once and parse it like the HTTP path
+                html = self.driver.page_source
                 
-                # Extract track info
-                try:
-                    title_element = wait.until(EC.presence_of_element_located((By.TAG_NAME, "h1")))
-                    title = title_element.text.strip()
-                    artist_element = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "h1 + p")))
-                    artist = artist_element.text.strip()
-                    logging.info(f"Found track info - Title: {title}, Artist: {artist}")
-                except Exception as e:
-                    logging.warning(f"Could not find track title or artist: {e}")
-                    title = "Unknown"
-                    artist = "Unknown"
-                
-                # Extract table data
-                df = self._extract_table_data(table)
+                # Save page source for debugging
+                self._save_debug_html(f"debug_{track_id}.html", html)
                 
-                if df.empty:
+                df = self._parse_track_page(html, data_type)
+                if df is None:
                     logging.warning("No data found in table")
                     retries += 1
-                    self._random_sleep(2.0, 4.0)
+                    self._backoff(retries)
                     continue
                 
-                # Add track info columns
-                df['song_name'] = title
-                df['artist_name'] = artist
-                
-                # Clean up numeric columns
-                for col in df.columns:
-                    if col not in ['date', 'song_name', 'artist_name']:
-                        df[col] = pd.to_numeric(df[col].str.replace(',', ''), errors='coerce')
-                
+                self._needs_browser[page_kind] = time.monotonic()
                 return df
                 
             except TimeoutException:
                 logging.error(f"Timeout waiting for table to load: {url}")
                 retries += 1
-                self._random_sleep(2.0, 4.0)
+                self._backoff(retries)
             except Exception as e:
                 logging.error(f"Error scraping track {track_id}: {e}")
                 retries += 1
-                self._random_sleep(2.0, 4.0)
+                self._backoff(retries)
         
         return None
     
-    def __del__(self):
-        """Clean up Selenium WebDriver."""
-        if self.driver:
+    def close(self):
+        """Release resources, returning the WebDriver to the shared pool.
+        
+        Queued debug files are written before it returns. The driver is only
+        quit if the pool is already full. Calling close() more than once is
+        harmless.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        _open_scrapers.discard(self)
+        if self._writer_thread is not None:
+            self._write_queue.put(None)
+            self._writer_thread.join()
+            self._writer_thread = None
+        self.session.close()
+        with self._driver_lock:
+            driver, self.driver = self.driver, None
+        if driver:
+            try:
+                ChartScraper._driver_pool.put_nowait(driver)
+            except queue.Full:
+                try:
+                    driver.quit()
+                except Exception as e:
+                    logging.warning(f"Error closing WebDriver: {e}")
+
+
+
+# Scrapers not yet closed, held weakly so this doesn't keep them alive
+_open_scrapers = weakref.WeakSet()
+
+
+def _close_open_scrapers():
+    """Close every scraper still open at exit."""
+    for scraper in list(_open_scrapers):
+        scraper.close()
+
+
+# close_pool is registered first so it runs last, after open scrapers have
+# returned their drivers to the pool
+atexit.register(ChartScraper.close_pool)
+atexit.register(_close_open_scrapers)
+
+
+def scrape_tracks(
+    track_ids: List[str],
+    data_type: str = "weekly",
+    workers: int = 8,
+    use_selenium: bool = False,
+    anti_bot: bool = False
+) -> Dict[str, Optional[pd.DataFrame]]:
+    """
+    Scrape several tracks concurrently on a thread pool.
+    
+    The work is network-bound, so threads overlap the waits. Without Selenium
+    all workers share one scraper (its requests session is thread-safe); with
+    Selenium each worker checks a scraper out of a pool, since a WebDriver
+    must not be used from two threads at once.
+    
+    Args:
+        track_ids: Spotify track IDs to scrape
+        data_type: "daily" or "weekly"
+        workers: Number of worker threads (and Chrome instances with Selenium)
+        use_selenium: Give each worker its own headless Chrome to fall back on
+        anti_bot: Forwarded to each ChartScraper
+        
+    Returns:
+        Mapping of track ID to its history DataFrame (None if scraping failed)
+    """
+    if not track_ids:
+        return {}
+    
+    workers = max(1, min(workers, len(track_ids), HTTP_POOL_SIZE))
+    scrapers = queue.Queue()
+    if not use_selenium:
+        shared = ChartScraper(use_selenium=False, anti_bot=anti_bot)
+    
+    def scrape_one(track_id: str) -> Optional[pd.DataFrame]:
+        if not use_selenium:
+            return shared.scrape_track_history(track_id, data_type=data_type)
+        scraper = scrapers.get()
+        try:
+            return scraper.scrape_track_history(track_id, data_type=data_type)
+        finally:
+            scrapers.put(scraper)
+    
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            if use_selenium:
+                # Start the Chrome instances in parallel rather than one by one;
+                # keep every one that started so the finally block closes them
+                # even if another failed
+                starting = [
+                    ex.submit(ChartScraper, use_selenium=True, anti_bot=anti_bot)
+                    for _ in range(workers)
+                ]
+                error = None
+                for future in starting:
+                    try:
+                        scrapers.put(future.result())
+                    except Exception as e:
+                        error = error or e
+                if error is not None:
+                    raise error
+            futures = {ex.submit(scrape_one, track_id): track_id for track_id in track_ids}
+            for future in as_completed(futures):
+                track_id = futures[future]
+                try:
+                    results[track_id] = future.result()
+                except Exception as e:
+                    logging.error(f"Error scraping track {track_id}: {e}")
+                    results[track_id] = None
+    finally:
+        if use_selenium:
+            while not scrapers.empty():
+                scrapers.get_nowait().close()
+        else:
+            shared.close()
+    
+    return {track_id: results[track_id] for track_id in track_ids}
+
+
+def scrape_countries(
+    country_codes: List[str],
+    data_type: str = "daily",
+    workers: int = 8
+) -> Dict[str, Optional[pd.DataFrame]]:
+    """
+    Scrape several country charts concurrently on a thread pool.
+    
+    All workers share one scraper, so the fetches reuse its pooled
+    keep-alive connections to kworb.net.
+    
+    Args:
+        country_codes: Country codes as used in kworb URLs (e.g. "us", "global")
+        data_type: "daily" or "weekly"
+        workers: Number of worker threads
+        
+    Returns:
+        Mapping of country code to its chart DataFrame (None if scraping failed)
+    """
+    if not country_codes:
+        return {}
+    
+    workers = max(1, min(workers, len(country_codes), HTTP_POOL_SIZE))
+    results = {}
+    with ChartScraper() as scraper, ThreadPoolExecutor(max_workers=workers) as ex:
+        futures = {
+            ex.submit(scraper.scrape_country_chart, code, data_type): code
+            for code in country_codes
+        }
+        for future in as_completed(futures):
+            code = futures[future]
             try:
-                self.driver.quit()
+                results[code] = future.result()
             except Exception as e:
-                logging.warning(f"Error closing WebDriver: {e}") 
\ No newline at end of file
+                logging.error(f"Error scraping country chart {code}: {e}")
+                results[code] = None
+    
+    return {code: results[code] for code in country_codes}
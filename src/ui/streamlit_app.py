@@ -1,9 +1,18 @@
-"""Streamlit app for Spotify chart data visualization."""
+"""Streamlit app for Spotify chart data visualization.
+
+pandas, the scraper and the AI helper (openai) are imported where they are
+first used, so the page can render before those dependencies load.
+"""
+from __future__ import annotations
+
 import streamlit as st
-import pandas as pd
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from pathlib import Path
+import numbers
+import re
 import sys
-import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional
 
 # Add the project root to Python path
 project_root = str(Path(__file__).parent.parent.parent)
@@ -11,11 +20,24 @@ if project_root not in sys.path:
     sys.path.append(project_root)
 
 # Import project modules using absolute imports
-from src.ai_helper import AIHelper
-from src.scraper import ChartScraper
-from src.cleaner import DataCleaner
 import src.config as config
 
+if TYPE_CHECKING:
+    import pandas as pd
+    from src.ai_helper import AIHelper
+    from src.scraper import ChartScraper
+
+# Track ID in a Spotify URL/URI or kworb URL, compiled once
+_TRACK_ID_RE = re.compile(r"(?:spotify\.com/track/|spotify:track:|kworb\.net/spotify/track/)([^?/.]+)")
+_VALID_TRACK_ID_RE = re.compile(r"[A-Za-z0-9-]+")
+
+# Date format of kworb track history rows (e.g. 2023/01/05)
+_HISTORY_DATE_FORMAT = "%Y/%m/%d"
+
+# Track history columns that are not markets, and the markets with their own metric
+_META_COLUMNS = frozenset({'date', 'song_name', 'artist_name'})
+_HEADLINE_MARKETS = frozenset({'Global', 'US', 'GB'})
+
 def extract_track_id(url: str) -> str:
     """Extract track ID from Spotify URL."""
     if not url:
@@ -24,74 +46,221 @@ def extract_track_id(url: str) -> str:
     # Clean the input
     url = url.strip()
     
-    # Handle different Spotify URL formats
-    if "spotify.com/track/" in url:
-        # Extract ID from full URL
-        track_id = url.split("track/")[-1].split("?")[0].split("/")[0]
-    elif "spotify:track:" in url:
-        # Extract ID from URI
-        track_id = url.split("spotify:track:")[-1].split("?")[0]
-    elif "kworb.net/spotify/track/" in url:
-        # Extract ID from Kworb URL
-        track_id = url.split("track/")[-1].split(".")[0]
-    else:
-        # Assume it's just the ID
-        track_id = url.split("?")[0].strip()
+    # Handle the Spotify URL/URI and kworb URL formats in one search;
+    # otherwise assume it's just the ID
+    match = _TRACK_ID_RE.search(url)
+    track_id = match.group(1) if match else url.partition("?")[0]
     
     # Clean the track ID
     track_id = track_id.strip()
     
     # Validate track ID format (should be a string of alphanumeric characters)
-    if not track_id.replace("-", "").isalnum():
+    if not _VALID_TRACK_ID_RE.fullmatch(track_id):
         st.error("❌ Invalid track ID format. Please provide a valid Spotify track URL or ID.")
         return ""
     
     return track_id
 
-def basic_analysis(df, data_type="weekly"):
-    """Provide basic statistical analysis without AI."""
+@st.cache_resource
+def get_scraper() -> ChartScraper:
+    """Create the scraper once per server process and reuse it across reruns."""
+    from src.scraper import ChartScraper
+    return ChartScraper()
+
+@st.cache_resource
+def get_ai_helper(api_key: str) -> AIHelper:
+    """Create one AI helper (and OpenAI client) per API key and reuse it across reruns."""
+    from src.ai_helper import AIHelper
+    return AIHelper(api_key=api_key)
+
+@st.cache_resource(ttl=3600, max_entries=512, show_spinner=False)
+def _cached_track_history(_scraper: ChartScraper, track_id: str, data_type: str) -> pd.DataFrame:
+    """Scrape a track's history, memoized per (track_id, data_type) for an hour.
+    
+    Cached as a resource so hits are keyed on the two strings only and the
+    DataFrame is neither pickled nor hashed. max_entries bounds the memory
+    held by cached DataFrames. Failed scrapes raise LookupError so they are
+    not cached and the next call retries.
+    """
+    df = _scraper.scrape_track_history(track_id, data_type=data_type)
+    if df is None:
+        raise LookupError(f"No history for track {track_id}")
+    return df
+
+@st.cache_resource(ttl=3600, max_entries=64, show_spinner=False)
+def _cached_country_chart(_scraper: ChartScraper, country_code: str, data_type: str) -> pd.DataFrame:
+    """Scrape a country chart, memoized per (country_code, data_type) for an hour.
+    
+    Failed scrapes raise LookupError so they are not cached.
+    """
+    df = _scraper.scrape_country_chart(country_code, data_type)
+    if df is None:
+        raise LookupError(f"No {data_type} chart for {country_code}")
+    return df
+
+def get_track_history(scraper: ChartScraper, track_id: str, data_type: str = "weekly") -> Optional[pd.DataFrame]:
+    """Return a copy of the cached track history, safe for the caller to modify, or None."""
+    try:
+        return _cached_track_history(scraper, track_id, data_type).copy()
+    except LookupError:
+        return None
+
+def get_country_chart(scraper: ChartScraper, country_code: str, data_type: str = "daily") -> Optional[pd.DataFrame]:
+    """Return a copy of the cached country chart, safe for the caller to modify, or None."""
+    try:
+        return _cached_country_chart(scraper, country_code, data_type).copy()
+    except LookupError:
+        return None
+
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def get_track_csv(track_id: str, data_type: str, _df: pd.DataFrame) -> str:
+    """Serialize a track history to CSV for the AI helper, once per (track_id, data_type).
+    
+    The DataFrame comes from get_track_history with the same key, so it is
+    excluded from hashing.
+    """
+    return _df.to_csv(index=False)
+
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def get_track_insights(_ai_helper: AIHelper, track_id: str, data_type: str, _csv: str) -> str:
+    """Ask the AI helper about a track once per (track_id, data_type) for an hour.
+    
+    The helper and data are excluded from the cache key. Failed calls
+    raise and are not cached, so they are retried on the next rerun.
+    """
+    return _ai_helper.analyze_track_data(_csv, raise_errors=True)
+
+def summary_rows(df, special_mask=None):
+    """Return the Total and Peak rows of a track history as dicts (None if absent).
+    
+    Stream counts are converted to Python ints and blank cells to None, so
+    they can be formatted with format_streams().
+    
+    Args:
+        df: Track history DataFrame
+        special_mask: Precomputed df['date'].isin(['Total', 'Peak']), if available
+    """
+    import pandas as pd
+    if special_mask is None:
+        special_mask = df['date'].isin(['Total', 'Peak'])
+    rows = {}
+    for row in df[special_mask].to_dict('records'):
+        if row['date'] not in rows:
+            rows[row['date']] = {
+                col: value if col in _META_COLUMNS
+                else None if pd.isna(value)
+                else int(value) if isinstance(value, numbers.Real)
+                else value
+                for col, value in row.items()
+            }
+    return rows.get('Total'), rows.get('Peak')
+
+def format_streams(value) -> str:
+    """Format a stream count with thousands separators, or "n/a" if it is blank."""
+    return "n/a" if value is None else f"{value:,}"
+
+def partition_columns(df):
+    """Split a track history's market columns once per DataFrame.
+    
+    Returns:
+        (markets, other_markets): every market except Global, and the
+        markets without a headline metric (all but Global, US and GB)
+    """
+    markets = [col for col in df.columns if col not in _META_COLUMNS and col != 'Global']
+    other_markets = [col for col in markets if col not in _HEADLINE_MARKETS]
+    return markets, other_markets
+
+def top_market(total_row: dict, markets: list) -> Optional[str]:
+    """Return the market with the most total streams (the first one on ties).
+    
+    Markets with a blank total are skipped; returns None if none has one.
+    """
+    import numpy as np
+    import pandas as pd
+    totals = np.fromiter(
+        (np.nan if pd.isna(total_row[m]) else total_row[m] for m in markets),
+        dtype=np.float64, count=len(markets)
+    )
+    if np.isnan(totals).all():
+        return None
+    return markets[int(np.nanargmax(totals))]
+
+def history_frame(df, special_mask=None):
+    """Return the dated rows of a track history (date and Global), parsed and sorted by date.
+    
+    Rows whose date does not parse are dropped rather than failing the view.
+    
+    Args:
+        df: Track history DataFrame
+        special_mask: Precomputed df['date'].isin(['Total', 'Peak']), if available
+    """
+    import pandas as pd
+    if special_mask is None:
+        special_mask = df['date'].isin(['Total', 'Peak'])
+    chart_df = df.loc[~special_mask, ['date', 'Global']]
+    chart_df = chart_df.assign(date=pd.to_datetime(
+        chart_df['date'], format=_HISTORY_DATE_FORMAT, errors='coerce', cache=True
+    ))
+    return chart_df.dropna(subset=['date']).sort_values('date', kind='stable')
+
+def basic_analysis(df, data_type="weekly", markets=None, chart_df=None, summary=None):
+    """Provide basic statistical analysis without AI.
+    
+    Args:
+        df: Track history DataFrame
+        data_type: "daily" or "weekly"
+        markets: Market columns from partition_columns(), if already computed
+        chart_df: history_frame(df), if already computed
+        summary: (total_row, peak_row) from summary_rows(df), if already computed
+    """
     insights = []
     
+    # Scan the date column at most once for the summary and dated rows
+    special_mask = None
+    if summary is None or chart_df is None:
+        special_mask = df['date'].isin(['Total', 'Peak'])
+    total_row, peak_row = summary if summary is not None else summary_rows(df, special_mask)
+    
     # Global performance
-    if 'Global' in df.columns:
-        total_streams = df[df['date'] == 'Total']['Global'].iloc[0]
-        peak_streams = df[df['date'] == 'Peak']['Global'].iloc[0] if 'Peak' in df['date'].values else None
-        insights.append(f"📈 Total Global Streams: {total_streams:,.0f}")
+    if 'Global' in df.columns and total_row is not None:
+        total_streams = total_row['Global']
+        peak_streams = peak_row['Global'] if peak_row is not None else None
+        insights.append(f"📈 Total Global Streams: {format_streams(total_streams)}")
         if peak_streams:
-            insights.append(f"🔝 Peak Global Streams: {peak_streams:,.0f}")
+            insights.append(f"🔝 Peak Global Streams: {format_streams(peak_streams)}")
     
     # Market performance
-    markets = [col for col in df.columns if col not in ['date', 'song_name', 'artist_name', 'Global']]
-    if markets:
-        total_row = df[df['date'] == 'Total'].iloc[0]
-        top_market = max(markets, key=lambda x: total_row[x])
-        insights.append(f"🌍 Best Performing Market: {top_market} with {total_row[top_market]:,.0f} streams")
+    if markets is None:
+        markets, _ = partition_columns(df)
+    best = top_market(total_row, markets) if markets and total_row is not None else None
+    if best is not None:
+        insights.append(f"🌍 Best Performing Market: {best} with {format_streams(total_row[best])} streams")
     
-    # Growth analysis
-    chart_df = df[~df['date'].isin(['Total', 'Peak'])].copy()
-    if not chart_df.empty:
-        chart_df['date'] = pd.to_datetime(chart_df['date'])
-        chart_df = chart_df.sort_values('date')
+    # Growth analysis (only the date and Global columns are needed)
+    if chart_df is None:
+        chart_df = history_frame(df, special_mask)
+    if len(chart_df) > 1:
+        import numpy as np
+        streams = chart_df['Global'].to_numpy(dtype=np.float64, na_value=np.nan)
+        first_streams = streams[0]
+        last_streams = streams[-1]
+        growth = ((last_streams - first_streams) / first_streams) * 100
+        trend = "📈 growing" if growth > 0 else "📉 declining"
+        
+        # Add time-specific insights
+        if data_type == "daily":
+            dates = chart_df['date']
+            days = (dates.iat[-1] - dates.iat[0]).days
+            avg_daily = np.nanmean(streams)
+            insights.append(f"📊 Daily average: {avg_daily:,.0f} streams")
+            insights.append(f"📅 Data spans {days} days")
+        else:  # weekly
+            weeks = len(chart_df)
+            avg_weekly = np.nanmean(streams)
+            insights.append(f"📊 Weekly average: {avg_weekly:,.0f} streams")
+            insights.append(f"📅 Data spans {weeks} weeks")
         
-        if len(chart_df) > 1:
-            first_streams = chart_df.iloc[0]['Global']
-            last_streams = chart_df.iloc[-1]['Global']
-            growth = ((last_streams - first_streams) / first_streams) * 100
-            trend = "📈 growing" if growth > 0 else "📉 declining"
-            
-            # Add time-specific insights
-            if data_type == "daily":
-                days = (chart_df.iloc[-1]['date'] - chart_df.iloc[0]['date']).days
-                avg_daily = chart_df['Global'].mean()
-                insights.append(f"📊 Daily average: {avg_daily:,.0f} streams")
-                insights.append(f"📅 Data spans {days} days")
-            else:  # weekly
-                weeks = len(chart_df)
-                avg_weekly = chart_df['Global'].mean()
-                insights.append(f"📊 Weekly average: {avg_weekly:,.0f} streams")
-                insights.append(f"📅 Data spans {weeks} weeks")
-            
-            insights.append(f"📈 The track is {trend} with {abs(growth):.1f}% change over the tracked period")
+        insights.append(f"📈 The track is {trend} with {abs(growth):.1f}% change over the tracked period")
     
     return "\n\n".join(insights)
 
@@ -147,7 +316,7 @@ def main():
     ai_helper = None
     if enable_ai and api_key:
         try:
-            ai_helper = AIHelper(api_key=api_key)
+            ai_helper = get_ai_helper(api_key)
         except ValueError as e:
             st.error(f"Error initializing AI helper: {str(e)}")
             st.warning("Please check your OpenAI API key and try again.")
@@ -156,7 +325,7 @@ def main():
 
     # Initialize scraper
     try:
-        scraper = ChartScraper(use_selenium=True)
+        scraper = get_scraper()
     except Exception as e:
         st.error(f"Error initializing scraper: {str(e)}")
         return
@@ -189,29 +358,29 @@ def main():
                 
                 # Scrape track history
                 with st.spinner(f"Fetching {data_type} track data..."):
-                    df = scraper.scrape_track_history(track_id, data_type=data_type)
+                    df = get_track_history(scraper, track_id, data_type)
 
                 if df is not None and not df.empty:
                     # Display track info
                     song_name = df['song_name'].iloc[0]
                     artist_name = df['artist_name'].iloc[0]
+                    markets, other_markets = partition_columns(df)
+                    special_mask = df['date'].isin(['Total', 'Peak'])
+                    chart_df = history_frame(df, special_mask)
+                    total_row, peak_row = summary_rows(df, special_mask)
                     
                     st.subheader("🎵 Track Information")
-                    col1, col2, col3 = st.columns([2, 2, 1])
-                    with col1:
-                        st.markdown(f"**Song:** {song_name}")
-                    with col2:
-                        st.markdown(f"**Artist:** {artist_name}")
-                    with col3:
-                        st.markdown(f"**Data Type:** {data_type.capitalize()}")
+                    st.markdown(
+                        f"**Song:** {song_name}\n\n"
+                        f"**Artist:** {artist_name}\n\n"
+                        f"**Data Type:** {data_type.capitalize()}"
+                    )
                     
                     # Display the data
                     st.subheader("📊 Track Performance")
                     
                     # Create metrics for Total streams
-                    if 'Total' in df['date'].values:
-                        total_row = df[df['date'] == 'Total'].iloc[0]
-                        peak_row = df[df['date'] == 'Peak'].iloc[0] if 'Peak' in df['date'].values else None
+                    if total_row is not None:
                         
                         # Display metrics in columns
                         metric_cols = st.columns(4)
@@ -220,8 +389,8 @@ def main():
                         with metric_cols[0]:
                             st.metric(
                                 "Global Streams",
-                                f"{total_row['Global']:,.0f}",
-                                f"Peak: {peak_row['Global']:,.0f}" if peak_row is not None else None
+                                format_streams(total_row['Global']),
+                                f"Peak: {format_streams(peak_row['Global'])}" if peak_row is not None else None
                             )
                         
                         # US streams
@@ -229,8 +398,8 @@ def main():
                             with metric_cols[1]:
                                 st.metric(
                                     "US Streams",
-                                    f"{total_row['US']:,.0f}",
-                                    f"Peak: {peak_row['US']:,.0f}" if peak_row is not None else None
+                                    format_streams(total_row['US']),
+                                    f"Peak: {format_streams(peak_row['US'])}" if peak_row is not None else None
                                 )
                         
                         # UK streams
@@ -238,64 +407,75 @@ def main():
                             with metric_cols[2]:
                                 st.metric(
                                     "UK Streams",
-                                    f"{total_row['GB']:,.0f}",
-                                    f"Peak: {peak_row['GB']:,.0f}" if peak_row is not None else None
+                                    format_streams(total_row['GB']),
+                                    f"Peak: {format_streams(peak_row['GB'])}" if peak_row is not None else None
                                 )
                         
                         # Other top market
-                        other_markets = [col for col in df.columns if col not in ['date', 'song_name', 'artist_name', 'Global', 'US', 'GB']]
-                        if other_markets:
-                            top_market = max(other_markets, key=lambda x: total_row[x])
+                        best = top_market(total_row, other_markets) if other_markets else None
+                        if best is not None:
                             with metric_cols[3]:
                                 st.metric(
-                                    f"Top Market ({top_market})",
-                                    f"{total_row[top_market]:,.0f}",
-                                    f"Peak: {peak_row[top_market]:,.0f}" if peak_row is not None else None
+                                    f"Top Market ({best})",
+                                    format_streams(total_row[best]),
+                                    f"Peak: {format_streams(peak_row[best])}" if peak_row is not None else None
                                 )
                     
                     # Process data with AI if enabled, otherwise show basic analysis
                     st.subheader("📈 Key Insights")
+                    insights_slot = st.container()
+                    ai_future = None
                     if enable_ai and ai_helper:
-                        try:
-                            with st.spinner("Analyzing data with AI..."):
-                                insights = ai_helper.analyze_track_data(df.to_dict("records"))
-                            st.write(insights)
-                        except Exception as e:
-                            st.error(f"Error analyzing data with AI: {str(e)}")
-                            if "Rate limit" in str(e):
-                                st.warning("OpenAI API rate limit reached. Please wait a few minutes and try again.")
-                            elif "Incorrect API key" in str(e):
-                                st.warning("Invalid API key. Please check your OpenAI API key in the sidebar.")
-                            # Fallback to basic analysis
-                            st.write(basic_analysis(df, data_type))
+                        # Run the OpenAI round trip in the background while the
+                        # chart and table below render; fill in the insights after.
+                        # The worker gets this run's context so st.cache_data works there.
+                        executor = ThreadPoolExecutor(
+                            max_workers=1,
+                            initializer=add_script_run_ctx,
+                            initargs=(None, get_script_run_ctx())
+                        )
+                        ai_future = executor.submit(
+                            get_track_insights, ai_helper, track_id, data_type,
+                            get_track_csv(track_id, data_type, df)
+                        )
+                        executor.shutdown(wait=False)
                     else:
-                        st.write(basic_analysis(df, data_type))
+                        with insights_slot:
+                            st.write(basic_analysis(df, data_type, markets, chart_df, (total_row, peak_row)))
                     
                     # Create line chart for streaming history
                     st.subheader("📈 Streaming History")
                     
-                    # Filter out Total and Peak rows and sort by date
-                    chart_df = df[~df['date'].isin(['Total', 'Peak'])].copy()
-                    chart_df['date'] = pd.to_datetime(chart_df['date'])
-                    chart_df = chart_df.sort_values('date')
-                    
-                    # Create the line chart focusing on Global streams
-                    chart_data = pd.DataFrame({
-                        'Date': chart_df['date'],
-                        'Global Streams': chart_df['Global']
-                    })
-                    
-                    # Create and display the chart
+                    # Create and display the line chart focusing on Global streams;
+                    # history_frame already holds just the two columns it needs
                     st.line_chart(
-                        chart_data.set_index('Date'),
+                        chart_df,
+                        x='date',
+                        y='Global',
                         height=400,
                         use_container_width=True
                     )
                     
-                    # Display the full data table in an expander
-                    with st.expander("📋 View Full Data"):
+                    # Display the full data table on request; an expander would
+                    # serialize the whole frame on every rerun even while collapsed
+                    if st.toggle("📋 View Full Data"):
                         st.dataframe(df, height=300)
                     
+                    if ai_future is not None:
+                        with insights_slot:
+                            try:
+                                with st.spinner("Analyzing data with AI..."):
+                                    insights = ai_future.result()
+                                st.write(insights)
+                            except Exception as e:
+                                st.error(f"Error analyzing data with AI: {str(e)}")
+                                if "Rate limit" in str(e):
+                                    st.warning("OpenAI API rate limit reached. Please wait a few minutes and try again.")
+                                elif "Incorrect API key" in str(e):
+                                    st.warning("Invalid API key. Please check your OpenAI API key in the sidebar.")
+                                # Fallback to basic analysis
+                                st.write(basic_analysis(df, data_type, markets, chart_df, (total_row, peak_row)))
+                    
                 else:
                     st.error("❌ No data found for this track. This could be because:")
                     st.markdown("""
@@ -329,7 +509,7 @@ def main():
         if country_code:
             try:
                 with st.spinner(f"Fetching {data_type} chart data for {country_code.upper()}..."):
-                    df = scraper.scrape_country_chart(country_code, data_type)
+                    df = get_country_chart(scraper, country_code, data_type)
                 
                 if df is not None and not df.empty:
                     st.subheader(f"📊 {country_code.upper()} {data_type.capitalize()} Charts")
@@ -65,6 +65,12 @@ def test_clean_artist_name():
     for input_name, expected in test_cases:
         assert DataCleaner._clean_artist_name(input_name) == expected
 
+def test_clean_artist_names_matches_scalar():
+    """Test vectorized artist name cleaning against the per-name version."""
+    names = pd.Series(['Artist1 ft. Artist2', 'Artist1 & Artist2', '  Artist1  ', None])
+    cleaned = DataCleaner._clean_artist_names(names)
+    assert cleaned.tolist() == [DataCleaner._clean_artist_name(name) for name in names]
+
 def test_deduplicate(cleaner, sample_data):
     """Test deduplication functionality."""
     # Add duplicate entry
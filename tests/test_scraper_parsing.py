@@ -0,0 +1,297 @@
+"""
+Tests for the scraper's parsing, page cache and batch helpers, which need no
+browser or network.
+"""
+import functools
+import threading
+import time
+from unittest.mock import Mock
+
+import lxml.html
+import pandas as pd
+import pytest
+import requests
+
+import src.scraper as scraper_module
+from src.config import CACHE_MAX_AGE
+from src.scraper import ChartScraper, PageCache, scrape_countries, scrape_tracks
+
+TRACK_HTML = """
+<html><body>
+    <h1>Test Song</h1>
+    <p>Test Artist</p>
+    <div class="weekly"><table>
+        <tr><th>date</th><th>Global</th></tr>
+        <tr><td>2023/01/05</td><td>1,000</td></tr>
+    </table></div>
+</body></html>
+"""
+
+
+def _response(status_code, text="", headers=None):
+    """Build a stand-in for a requests.Response."""
+    response = Mock()
+    response.status_code = status_code
+    response.text = text
+    response.headers = headers or {}
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.HTTPError(str(status_code))
+    return response
+
+
+@pytest.fixture
+def cached_scraper(tmp_path):
+    """A scraper whose page cache lives in a temporary directory."""
+    scraper = ChartScraper(use_cache=False)
+    scraper.cache = PageCache(tmp_path)
+    scraper.session.get = Mock()
+    yield scraper
+    scraper.close()
+
+
+@pytest.fixture
+def tmp_page_cache(tmp_path, monkeypatch):
+    """Make scrapers built inside batch helpers use a temporary page cache."""
+    monkeypatch.setattr(scraper_module, "PageCache", functools.partial(PageCache, tmp_path))
+
+
+def test_parse_table_html():
+    """Test parsing weekly and daily table cells from HTML."""
+    html = """
+    <table>
+        <tr><th>Date</th><th>Global</th><th>US</th></tr>
+        <tr><td>2023/01/05</td><td>1,234,567</td><td>890,123</td></tr>
+        <tr><td>2023/01/06</td><td><span class="s">2,000</span><span>+5</span></td><td>10</td></tr>
+        <tr><td>short row</td></tr>
+    </table>
+    """
+    df = ChartScraper._parse_table(lxml.html.fromstring(html), text_columns=('Date',))
+    
+    assert list(df.columns) == ['Date', 'Global', 'US']
+    assert len(df) == 2
+    assert df.iloc[0]['Date'] == '2023/01/05'
+    assert df.iloc[0]['Global'] == 1234567
+    assert df.iloc[1]['Global'] == 2000
+    assert df.iloc[1]['US'] == 10
+
+
+def test_parse_track_page():
+    """Test parsing a static track page without a browser."""
+    html = """
+    <html><body>
+        <h1>Test Song</h1>
+        <p>Test Artist</p>
+        <div class="weekly"><table>
+            <tr><th>date</th><th>Global</th></tr>
+            <tr><td>Total</td><td>3,000</td></tr>
+            <tr><td>2023/01/05</td><td>1,000</td></tr>
+        </table></div>
+        <div class="daily"><table>
+            <tr><th>date</th><th>Global</th></tr>
+            <tr><td>2023/01/05</td><td><span class="s">100</span></td></tr>
+        </table></div>
+    </body></html>
+    """
+    scraper = ChartScraper(use_selenium=False, use_cache=False)
+    
+    weekly = scraper._parse_track_page(html, "weekly")
+    assert len(weekly) == 2
+    assert weekly.iloc[0]['Global'] == 3000
+    assert weekly.iloc[0]['song_name'] == 'Test Song'
+    assert weekly.iloc[0]['artist_name'] == 'Test Artist'
+    
+    daily = scraper._parse_track_page(html, "daily")
+    assert len(daily) == 1
+    assert daily.iloc[0]['Global'] == 100
+    
+    assert scraper._parse_track_page("<html><body></body></html>") is None
+
+
+def test_parse_track_page_daily_needs_daily_table():
+    """Test a page with only the weekly table has no static daily view."""
+    html = """
+    <html><body>
+        <h1>Test Song</h1>
+        <div class="weekly"><table>
+            <tr><th>date</th><th>Global</th></tr>
+            <tr><td>2023/01/05</td><td>1,000</td></tr>
+        </table></div>
+    </body></html>
+    """
+    scraper = ChartScraper(use_selenium=False, use_cache=False)
+    
+    assert scraper._parse_track_page(html, "daily") is None
+    assert len(scraper._parse_track_page(html, "weekly")) == 1
+
+
+def test_parse_number():
+    """Test comma-grouped number parsing."""
+    assert ChartScraper._parse_number("1,234,567") == 1234567
+    assert ChartScraper._parse_number("12.5") == 12.5
+    assert ChartScraper._parse_number("") is None
+    assert ChartScraper._parse_number("--") is None
+
+
+def test_to_numeric_keeps_text_columns():
+    """Test numeric cleanup converts number columns and leaves text alone."""
+    df = pd.DataFrame({
+        'Artist and Title': ['A - Song', 'B - Other'],
+        'P+': ['+1', '='],
+        'Streams': ['1,234', '56'],
+    })
+    
+    result = ChartScraper._to_numeric(df, exclude=['date'])
+    
+    assert list(result['Artist and Title']) == ['A - Song', 'B - Other']
+    assert list(result['P+']) == ['+1', '=']
+    assert list(result['Streams']) == [1234, 56]
+
+
+def test_to_numeric_mostly_numbers():
+    """Test a column with a stray placeholder is still converted."""
+    df = pd.DataFrame({'Streams': ['1,000'] * 9 + ['-']})
+    
+    result = ChartScraper._to_numeric(df, exclude=['date'])
+    
+    assert list(result['Streams'][:9]) == [1000] * 9
+    assert pd.isna(result['Streams'].iloc[9])
+
+
+def test_fetch_conditional_get(cached_scraper):
+    """Test a 200 is cached, served fresh, then revalidated with a 304."""
+    get = cached_scraper.session.get
+    get.return_value = _response(200, TRACK_HTML, {"ETag": '"v1"'})
+    
+    first = cached_scraper.scrape_track_history("abc")
+    assert list(first['Global']) == [1000]
+    assert get.call_count == 1
+    
+    # Fresh entries are served without a request
+    fresh = cached_scraper.scrape_track_history("abc")
+    assert list(fresh['Global']) == [1000]
+    assert get.call_count == 1
+    
+    # Stale entries are revalidated; a 304 serves the cached copy
+    with cached_scraper.cache._db:
+        cached_scraper.cache._db.execute("UPDATE pages SET stored_at = 0")
+    get.return_value = _response(304)
+    revalidated = cached_scraper.scrape_track_history("abc")
+    assert list(revalidated['Global']) == [1000]
+    assert get.call_count == 2
+    assert get.call_args.kwargs['headers'] == {"If-None-Match": '"v1"'}
+    
+    # The 304 refreshed the entry, so it is fresh again
+    cached_scraper.scrape_track_history("abc")
+    assert get.call_count == 2
+
+
+def test_fetch_stale_entry_refetched(cached_scraper):
+    """Test a stale entry is replaced when the page has changed."""
+    get = cached_scraper.session.get
+    get.return_value = _response(200, TRACK_HTML, {"ETag": '"v1"'})
+    cached_scraper.scrape_track_history("abc")
+    
+    with cached_scraper.cache._db:
+        cached_scraper.cache._db.execute("UPDATE pages SET stored_at = 0")
+    get.return_value = _response(200, TRACK_HTML.replace("1,000", "2,000"), {"ETag": '"v2"'})
+    
+    refetched = cached_scraper.scrape_track_history("abc")
+    assert list(refetched['Global']) == [2000]
+    assert cached_scraper.cache.conditional_headers("track_abc_weekly") == {"If-None-Match": '"v2"'}
+
+
+def test_fetch_http_error_returns_none(cached_scraper):
+    """Test an HTTP error status is reported as a failed scrape."""
+    cached_scraper.session.get.return_value = _response(404)
+    
+    assert cached_scraper.scrape_track_history("missing") is None
+    assert cached_scraper.cache.load("track_missing_weekly") is None
+
+
+def test_prefers_browser_expires(cached_scraper):
+    """Test the browser-only hint lapses after CACHE_MAX_AGE."""
+    page_kind = ("track", "daily")
+    assert not cached_scraper._prefers_browser(page_kind)
+    
+    cached_scraper._needs_browser[page_kind] = time.monotonic()
+    assert cached_scraper._prefers_browser(page_kind)
+    
+    cached_scraper._needs_browser[page_kind] = time.monotonic() - CACHE_MAX_AGE - 1
+    assert not cached_scraper._prefers_browser(page_kind)
+    assert page_kind not in cached_scraper._needs_browser
+
+
+def test_prefers_browser_still_reads_cache(cached_scraper):
+    """Test the browser-only hint skips the HTTP fetch but not the page cache."""
+    get = cached_scraper.session.get
+    get.return_value = _response(200, TRACK_HTML)
+    cached_scraper.scrape_track_history("abc")
+    cached_scraper._needs_browser[("track", "weekly")] = time.monotonic()
+    cached_scraper._render_track_history = Mock(return_value=None)
+    
+    cached = cached_scraper.scrape_track_history("abc")
+    assert list(cached['Global']) == [1000]
+    assert not cached_scraper._render_track_history.called
+    
+    assert cached_scraper.scrape_track_history("other") is None
+    assert cached_scraper._render_track_history.called
+    assert get.call_count == 1
+
+
+def test_scrape_tracks(tmp_page_cache, monkeypatch):
+    """Test batch track scraping keeps input order and maps failures to None."""
+    def fake_history(self, track_id, data_type="weekly"):
+        if track_id == "boom":
+            raise RuntimeError("boom")
+        return None if track_id == "empty" else pd.DataFrame({'Global': [len(track_id)]})
+    monkeypatch.setattr(ChartScraper, "scrape_track_history", fake_history)
+    
+    results = scrape_tracks(["a", "boom", "empty", "abc"], workers=2)
+    
+    assert list(results) == ["a", "boom", "empty", "abc"]
+    assert results["boom"] is None
+    assert results["empty"] is None
+    assert list(results["abc"]['Global']) == [3]
+    assert scrape_tracks([]) == {}
+
+
+def test_scrape_tracks_closes_started_scrapers(tmp_page_cache, monkeypatch):
+    """Test the Selenium warm-up closes every scraper that started if one fails."""
+    lock = threading.Lock()
+    calls, started, closed = [], [], []
+    
+    def fake_setup_driver(self):
+        with lock:
+            calls.append(self)
+            if len(calls) == 2:
+                raise RuntimeError("chrome failed to start")
+            started.append(self)
+    
+    original_close = ChartScraper.close
+    
+    def recording_close(self):
+        closed.append(self)
+        original_close(self)
+    monkeypatch.setattr(ChartScraper, "_setup_driver", fake_setup_driver)
+    monkeypatch.setattr(ChartScraper, "close", recording_close)
+    
+    with pytest.raises(RuntimeError):
+        scrape_tracks(["a", "b", "c"], workers=3, use_selenium=True)
+    
+    assert len(started) == 2
+    assert all(scraper in closed for scraper in started)
+
+
+def test_scrape_countries(tmp_page_cache, monkeypatch):
+    """Test batch chart scraping keeps input order and maps failures to None."""
+    def fake_chart(self, country_code, data_type="daily"):
+        if country_code == "xx":
+            raise RuntimeError("boom")
+        return pd.DataFrame({'country': [country_code.upper()]})
+    monkeypatch.setattr(ChartScraper, "scrape_country_chart", fake_chart)
+    
+    results = scrape_countries(["us", "xx", "gb"], workers=3)
+    
+    assert list(results) == ["us", "xx", "gb"]
+    assert results["xx"] is None
+    assert list(results["gb"]['country']) == ["GB"]
@@ -113,4 +113,60 @@ def test_export_controls():
         assert 'excel' not in formats
         assert 'json' in formats
         assert 'parquet' not in formats
-        assert mock_checkbox.call_count == 4 
\ No newline at end of file
+        assert mock_checkbox.call_count == 4 
+@pytest.fixture
+def track_history():
+    """Create a track history with blank market cells and no Peak row."""
+    return pd.DataFrame({
+        'date': ['Total', '2023/01/05', '2023/01/06'],
+        'Global': pd.array([3000, 1000, 2000], dtype='Int64'),
+        'US': pd.array([pd.NA, 400, pd.NA], dtype='Int64'),
+        'GB': [None, 300.0, 250.0],
+        'DE': pd.array([1200, 600, 600], dtype='Int64'),
+        'song_name': ['Test Song'] * 3,
+        'artist_name': ['Test Artist'] * 3
+    })
+
+def test_summary_rows(track_history):
+    """Test Total/Peak extraction with blank cells and a missing Peak row."""
+    total_row, peak_row = streamlit_app.summary_rows(track_history)
+    
+    assert peak_row is None
+    assert total_row['Global'] == 3000
+    assert type(total_row['Global']) is int
+    assert total_row['US'] is None
+    assert total_row['GB'] is None
+    assert total_row['song_name'] == 'Test Song'
+
+def test_top_market(track_history):
+    """Test the top market skips blank totals."""
+    total_row, _ = streamlit_app.summary_rows(track_history)
+    markets, _ = streamlit_app.partition_columns(track_history)
+    
+    assert streamlit_app.top_market(total_row, markets) == 'DE'
+    assert streamlit_app.top_market({'US': 5, 'GB': 5}, ['US', 'GB']) == 'US'
+
+def test_top_market_all_blank():
+    """Test the top market is None when no market has a total."""
+    total_row = {'US': None, 'GB': pd.NA, 'DE': float('nan')}
+    
+    assert streamlit_app.top_market(total_row, ['US', 'GB', 'DE']) is None
+    assert streamlit_app.top_market({}, []) is None
+
+def test_format_streams():
+    """Test stream counts are grouped and blanks shown as n/a."""
+    assert streamlit_app.format_streams(1234567) == "1,234,567"
+    assert streamlit_app.format_streams(0) == "0"
+    assert streamlit_app.format_streams(None) == "n/a"
+
+def test_history_frame_skips_bad_dates():
+    """Test dated rows are sorted and unparseable dates dropped."""
+    df = pd.DataFrame({
+        'date': ['Total', '2023/01/06', 'n/a', '2023/01/05', 'Peak'],
+        'Global': [3000, 2000, 5, 1000, 2000]
+    })
+    
+    chart_df = streamlit_app.history_frame(df)
+    
+    assert list(chart_df['Global']) == [1000, 2000]
+    assert chart_df['date'].iloc[0] == pd.Timestamp('2023-01-05')